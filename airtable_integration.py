@@ -1,21 +1,30 @@
 """Integration module to send Greylitsearcher results to Airtable via data processor."""
 
+import gzip
 import requests
-import json
 from typing import Dict, List, Any, Optional
+from json_utils import json_dumps, json_loads
+
+
+# Request bodies larger than this many bytes are gzip-compressed
+GZIP_MIN_BYTES = 4096
 
 
 class AirtableProcessorClient:
     """Client to send search results to data processor service."""
     
-    def __init__(self, processor_url: str = "http://localhost:8001/process"):
+    def __init__(self, processor_url: str = "http://localhost:8001/process", gzip_requests: bool = True):
         """
         Initialize client.
         
         Args:
             processor_url: URL of the data processor service endpoint
+            gzip_requests: Send large payloads gzip-compressed with `Content-Encoding: gzip`.
+                The processor service must accept gzip request bodies; disable otherwise.
         """
         self.processor_url = processor_url
+        self.gzip_requests = gzip_requests
+        self._session = requests.Session()
     
     def send_results(
         self,
@@ -34,18 +43,19 @@ class AirtableProcessorClient:
         Returns:
             Response from processor service
         """
-        all_results = []
+        # Pre-size the list instead of growing it item by item
+        all_results = [None] * sum(len(items) for items in results.values())
+        i = 0
         
         for website, items in results.items():
             query_info = search_queries.get(website, {})
             search_query = query_info.get("query", f"search on {website}")
             
             for item in items:
-                # Add search context
-                item_with_context = item.copy()
-                item_with_context["search_query"] = search_query
-                item_with_context["priority"] = priority
-                all_results.append(item_with_context)
+                # Add search context; build new dicts so the caller's items
+                # (e.g. st.session_state results) are left untouched
+                all_results[i] = {**item, "search_query": search_query, "priority": priority}
+                i += 1
         
         payload = {
             "results": all_results,
@@ -53,16 +63,23 @@ class AirtableProcessorClient:
             "priority": priority
         }
         
+        body = json_dumps(payload)
+        headers = {"Content-Type": "application/json"}
+        if self.gzip_requests and len(body) > GZIP_MIN_BYTES:
+            body = gzip.compress(body)
+            headers["Content-Encoding"] = "gzip"
+        
         try:
-            response = requests.post(
+            response = self._session.post(
                 self.processor_url,
-                json=payload,
-                headers={"Content-Type": "application/json"},
+                data=body,
+                headers=headers,
                 timeout=30
             )
             response.raise_for_status()
-            return response.json()
-        except requests.exceptions.RequestException as e:
+            return json_loads(response.content)
+        except (requests.exceptions.RequestException, ValueError) as e:
+            # ValueError covers invalid JSON in the response body
             print(f"Error sending to processor: {e}")
             return {"error": str(e)}
 
@@ -5,13 +5,45 @@ Use this if you want to skip the processor service and write directly to Airtabl
 See ARCHITECTURE_DECISIONS.md for trade-offs.
 """
 
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait
 from datetime import datetime
-from typing import Dict, List, Any
+from typing import Dict, List, Any, Literal, Optional, Set, Tuple
+from urllib.parse import urlparse
 from pyairtable import Table
 import streamlit as st
 
 
+def _escape_formula_string(value: str) -> str:
+    """Escape a value for use inside a single-quoted Airtable formula string."""
+    return value.replace("\\", "\\\\").replace("'", "\\'")
+
+
+class TokenBucket:
+    """Thread-safe token bucket allowing `rate` acquisitions per second, bursting up to `capacity`."""
+    
+    def __init__(self, rate: float = 5, capacity: int = 1):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+    
+    def acquire(self) -> None:
+        """Block until a token is available, then consume it."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait_time = (1 - self._tokens) / self.rate
+            time.sleep(wait_time)
+
+
 class DirectAirtableIntegration:
     """Direct integration with Airtable from Streamlit."""
     
@@ -27,17 +59,31 @@ class DirectAirtableIntegration:
         self.table = Table(token, base_id, table_name)
         self.token = token
         self.base_id = base_id
+        # Airtable allows 5 requests/second per base. A capacity of 1 spaces requests
+        # 0.2s apart; a larger burst would exceed the cap (and trigger a 30s lockout)
+        # when the bucket starts full and refills while requests are in flight
+        self.rate_limiter = TokenBucket(rate=5, capacity=1)
     
     def extract_domain(self, url: str) -> str:
         """Extract domain from URL."""
+        if not url:
+            return ""
+        # Fast path: the host is everything between "://" and the next "/", "?" or "#"
+        domain = url.partition("://")[2].partition("/")[0].partition("?")[0].partition("#")[0]
+        if domain:
+            return domain.lower()
         try:
-            from urllib.parse import urlparse
-            parsed = urlparse(url)
-            return parsed.netloc
+            return urlparse(url).netloc.lower()
         except Exception:
             return ""
     
-    def normalize_record(self, item: Dict[str, Any], search_query: str, priority: int) -> Dict[str, Any]:
+    def normalize_record(
+        self,
+        item: Dict[str, Any],
+        search_query: str,
+        priority: int,
+        scraped_at: Optional[str] = None
+    ) -> Dict[str, Any]:
         """
         Normalize a search result item for Airtable.
         
@@ -57,7 +103,12 @@ class DirectAirtableIntegration:
         - status
         
         Extra fields in your Airtable table are fine - they'll just remain empty.
+        
+        scraped_at defaults to today's UTC date; pass it in when normalizing many
+        records at once to avoid recomputing it per record.
         """
+        if scraped_at is None:
+            scraped_at = datetime.utcnow().date().isoformat()
         return {
             "title": item.get("title", ""),
             "link": item.get("link", ""),
@@ -65,7 +116,7 @@ class DirectAirtableIntegration:
             "source_domain": self.extract_domain(item.get("link", "")),
             "search_query": search_query,
             "priority": priority,
-            "scraped_at": datetime.utcnow().date().isoformat(),
+            "scraped_at": scraped_at,
             "status": "Todo"
         }
     
@@ -75,7 +126,11 @@ class DirectAirtableIntegration:
         search_queries: Dict[str, str] = None,
         priority: int = 1,
         check_duplicates: bool = False,
-        progress_callback=None
+        progress_callback=None,
+        batch_size: int = 10,
+        duplicate_chunk_size: int = 50,
+        max_workers: int = 5,
+        duplicate_strategy: Literal["bulk-scan", "chunked"] = "bulk-scan"
     ) -> Dict[str, int]:
         """
         Save results directly to Airtable.
@@ -86,12 +141,24 @@ class DirectAirtableIntegration:
             priority: Priority level (1-3)
             check_duplicates: Whether to check for duplicates before inserting
             progress_callback: Optional callback function(processed, total, created, errors)
+            batch_size: Number of records per create request (Airtable allows at most 10)
+            duplicate_chunk_size: Number of links checked per duplicate lookup request
+                (only used by the "chunked" duplicate strategy)
+            max_workers: Number of create requests in flight at once
+            duplicate_strategy: How duplicates are found when check_duplicates is True:
+                "bulk-scan" reads every existing link once before saving (fastest for
+                tables up to a few thousand records), "chunked" looks up only the links
+                being saved, one query per duplicate_chunk_size links (better for large tables)
         
         Returns:
             Dictionary with statistics: {created, duplicates, errors, processed}
         """
         if search_queries is None:
             search_queries = {}
+        if duplicate_strategy not in ("bulk-scan", "chunked"):
+            raise ValueError(f"Unknown duplicate_strategy: {duplicate_strategy!r}")
+        batch_size = max(1, min(batch_size, 10))
+        duplicate_chunk_size = max(1, duplicate_chunk_size)
         
         stats = {
             "processed": 0,
@@ -100,80 +167,150 @@ class DirectAirtableIntegration:
             "errors": 0
         }
         
-        all_items = []
+        # Pre-size the list instead of growing it item by item
+        total = sum(len(items) for items in results.values())
+        all_items = [None] * total
+        i = 0
         for website, items in results.items():
             query = search_queries.get(website, f"search on {website}")
             for item in items:
                 # Use item's priority if available, otherwise use default priority
                 item_priority = item.get('priority', priority)
-                all_items.append((item, query, item_priority))
+                all_items[i] = (item, query, item_priority)
+                i += 1
+        
+        scraped_at = datetime.utcnow().date().isoformat()
+        batch = []
+        # Links already in Airtable or queued during this call
+        known_links = set()
+        if check_duplicates and duplicate_strategy == "bulk-scan":
+            known_links = self._fetch_all_links()
         
-        total = len(all_items)
+        def record_batch(future):
+            # Runs on the calling thread so progress_callback can update Streamlit
+            size, created = future.result()
+            stats["created"] += created
+            stats["errors"] += size - created
+            stats["processed"] += size
+            if progress_callback:
+                progress_callback(stats["processed"], total, stats["created"], stats["errors"])
         
-        for idx, (item, query, item_priority) in enumerate(all_items):
-            try:
-                link = item.get("link", "")
-                if not link:
-                    stats["errors"] += 1
-                    stats["processed"] += 1
-                    continue
+        # Create requests run in a thread pool, paced by the shared rate limiter
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            pending = set()
+            
+            for chunk_start in range(0, total, duplicate_chunk_size):
+                chunk = all_items[chunk_start:chunk_start + duplicate_chunk_size]
+                
+                # Optional duplicate check (slower but prevents duplicates),
+                # one lookup request per chunk of links
+                if check_duplicates and duplicate_strategy == "chunked":
+                    known_links.update(self._find_existing_links(
+                        [item.get("link", "") for item, _, _ in chunk]
+                    ))
                 
-                # Optional duplicate check (slower but prevents duplicates)
-                if check_duplicates:
-                    try:
-                        from pyairtable.formulas import match
-                        formula = match({"link": link})
-                        existing = self.table.all(formula=formula, max_records=1)
-                        if existing:
+                for item, query, item_priority in chunk:
+                    link = item.get("link", "")
+                    if not link:
+                        stats["errors"] += 1
+                        stats["processed"] += 1
+                        if progress_callback:
+                            progress_callback(stats["processed"], total, stats["created"], stats["errors"])
+                        continue
+                    
+                    if check_duplicates:
+                        if link in known_links:
                             stats["duplicates"] += 1
                             stats["processed"] += 1
                             if progress_callback:
-                                progress_callback(idx + 1, total, stats["created"], stats["errors"])
+                                progress_callback(stats["processed"], total, stats["created"], stats["errors"])
                             continue
-                    except Exception as dup_error:
-                        # If duplicate check fails (e.g., field doesn't exist), skip it and continue
-                        # This allows the record to be created even if duplicate check fails
-                        print(f"Warning: Duplicate check failed for {link}: {dup_error}")
-                        # Continue to create the record anyway
-                
-                # Normalize and create record
-                record = self.normalize_record(item, query, item_priority)
-                
-                # Airtable will automatically ignore fields that don't exist in the table
-                # Extra fields in your table are fine - they'll just remain empty
-                # Only required fields (title, link) must exist
-                self.table.create(record)
-                stats["created"] += 1
-                stats["processed"] += 1
-                
-                # Rate limiting: Airtable allows 5 requests/second
-                # Sleep 0.2 seconds = 5 requests/second max
-                time.sleep(0.2)
+                        known_links.add(link)
+                    
+                    # Normalize and queue record; records are created in batches
+                    batch.append(self.normalize_record(item, query, item_priority, scraped_at))
+                    if len(batch) >= batch_size:
+                        pending.add(executor.submit(self._create_batch, batch))
+                        batch = []
                 
-                # Progress callback
-                if progress_callback:
-                    progress_callback(idx + 1, total, stats["created"], stats["errors"])
-                
-            except Exception as e:
-                stats["errors"] += 1
-                stats["processed"] += 1
-                if progress_callback:
-                    progress_callback(idx + 1, total, stats["created"], stats["errors"])
-                # Log error but continue processing
-                error_msg = str(e)
-                print(f"Error saving record {link}: {error_msg}")
-                
-                # Provide helpful error messages
-                if "403" in error_msg or "INVALID_PERMISSIONS" in error_msg:
-                    print("  -> Check: Token has 'data.records:write' scope")
-                    print("  -> Check: Token has access to this base and table")
-                    print("  -> Check: Table name is correct")
-                elif "NOT_FOUND" in error_msg or "model" in error_msg.lower():
-                    print("  -> Check: Table name is correct")
-                    print("  -> Check: Table exists in the base")
-                    print("  -> Check: Field names match your Airtable schema")
+                # Report batches that finished while this chunk was prepared
+                done, pending = wait(pending, timeout=0)
+                for future in done:
+                    record_batch(future)
+            
+            # Flush the final partial batch
+            if batch:
+                pending.add(executor.submit(self._create_batch, batch))
+            
+            for future in as_completed(pending):
+                record_batch(future)
         
         return stats
+    
+    def _fetch_all_links(self) -> Set[str]:
+        """Return every link in the table, reading only the link field, 100 records per request."""
+        links = set()
+        try:
+            self.rate_limiter.acquire()
+            for page in self.table.iterate(fields=["link"], page_size=100):
+                links.update(record["fields"].get("link") for record in page)
+                # Fetching the next page is another request
+                self.rate_limiter.acquire()
+        except Exception as dup_error:
+            # If duplicate check fails (e.g., field doesn't exist), skip it and continue
+            # This allows the records to be created even if duplicate check fails
+            print(f"Warning: Duplicate check failed while reading existing links: {dup_error}")
+        links.discard(None)
+        return links
+    
+    def _find_existing_links(self, links: List[str]) -> Set[str]:
+        """Return the subset of links that already exist in the table, using a single query."""
+        links = [link for link in links if link]
+        if not links:
+            return set()
+        conditions = ",".join(
+            f"{{link}}='{_escape_formula_string(link)}'" for link in links
+        )
+        try:
+            self.rate_limiter.acquire()
+            existing = self.table.all(formula=f"OR({conditions})", fields=["link"])
+        except Exception as dup_error:
+            # If duplicate check fails (e.g., field doesn't exist), skip it and continue
+            # This allows the records to be created even if duplicate check fails
+            print(f"Warning: Duplicate check failed for {len(links)} links: {dup_error}")
+            return set()
+        return {record["fields"].get("link") for record in existing} - {None}
+    
+    def _create_batch(self, records: List[Dict[str, Any]]) -> Tuple[int, int]:
+        """
+        Create a batch of normalized records with a single Airtable request.
+        
+        Safe to call from worker threads. Returns (batch size, records created).
+        """
+        # Rate limiting: Airtable allows 5 requests/second
+        self.rate_limiter.acquire()
+        try:
+            # Airtable will automatically ignore fields that don't exist in the table
+            # Extra fields in your table are fine - they'll just remain empty
+            # Only required fields (title, link) must exist
+            self.table.batch_create(records, typecast=False)
+            return len(records), len(records)
+        except Exception as e:
+            # Log error but continue processing
+            error_msg = str(e)
+            links = ", ".join(record["link"] for record in records)
+            print(f"Error saving records {links}: {error_msg}")
+            
+            # Provide helpful error messages
+            if "403" in error_msg or "INVALID_PERMISSIONS" in error_msg:
+                print("  -> Check: Token has 'data.records:write' scope")
+                print("  -> Check: Token has access to this base and table")
+                print("  -> Check: Table name is correct")
+            elif "NOT_FOUND" in error_msg or "model" in error_msg.lower():
+                print("  -> Check: Table name is correct")
+                print("  -> Check: Table exists in the base")
+                print("  -> Check: Field names match your Airtable schema")
+            return len(records), 0
 
 
 # Example usage in Streamlit main.py:
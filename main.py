@@ -1,7 +1,14 @@
-import pandas as pd
+import csv
+import io
+import threading
+import time
 import streamlit as st
+from concurrent.futures import ThreadPoolExecutor
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from direct_airtable_integration import DirectAirtableIntegration
+from json_utils import json_loads
 
 
 # Password authentication
@@ -73,6 +80,48 @@ GS_KEYS = [
     st.secrets['GS3_KEY'],
 ]
 
+# Number of websites searched concurrently
+SEARCH_WORKERS = 8
+# Number of result pages of one search fetched concurrently
+PAGE_WAVE_SIZE = 4
+# Seconds a rate-limited API key is skipped before it is tried again
+KEY_COOLDOWN_SECONDS = 60
+
+# Streamlit reruns this script on every interaction, so state that must outlive a run
+# (and be shared by all sessions) comes from st.cache_resource factories. They are
+# resolved here on the script thread; search worker threads only use the results.
+
+
+@st.cache_resource
+def _http_session():
+    """Pooled HTTP session; 429 is not retried since rate-limited keys are rotated instead."""
+    session = requests.Session()
+    session.mount("https://", HTTPAdapter(
+        pool_connections=SEARCH_WORKERS * PAGE_WAVE_SIZE,
+        pool_maxsize=SEARCH_WORKERS * PAGE_WAVE_SIZE,
+        max_retries=Retry(total=2, backoff_factor=0.3,
+                          status_forcelist=[500, 502, 503, 504], raise_on_status=False)
+    ))
+    return session
+
+
+@st.cache_resource
+def _key_cooldowns():
+    """Map each rate-limited API key to the time.monotonic() at which it may be used again."""
+    return {}
+
+
+_session = _http_session()
+_cooldowns = _key_cooldowns()
+
+
+def _active_keys():
+    """Yield the (cx, key) pairs whose rate-limit cooldown has expired."""
+    now = time.monotonic()
+    for cx, key in zip(GS_CX, GS_KEYS):
+        if _cooldowns.get(key, 0) <= now:
+            yield cx, key
+
 
 def google_search(page, site, **kwargs):
     url = 'https://www.googleapis.com/customsearch/v1'
@@ -85,19 +134,124 @@ def google_search(page, site, **kwargs):
         'siteSearch': site
     }
     params.update(kwargs)
-    for cx, key in zip(GS_CX, GS_KEYS):
+    for cx, key in _active_keys():
         params['cx'] = cx
         params['key'] = key
         # return {'items': [{'link': 'https://www.google.com'}]}
-        response = requests.get(url, params=params).json()
+        http_response = _session.get(url, params=params, timeout=10)
+        try:
+            response = json_loads(http_response.content)
+        except ValueError as e:
+            # Treat an unparseable body like an empty page rather than a rate limit
+            print(f"Invalid JSON from the search API for {site} (page {page}): {e}")
+            return {}
         # Check if the response is successful or if the rate limit has been exceeded
         if not response.get('error') or 'rateLimitExceeded' not in response['error']['errors'][0]['reason']:
             return response
+        # Skip this key until its cooldown has passed
+        _cooldowns[key] = time.monotonic() + KEY_COOLDOWN_SECONDS
     # If all keys exceeded the rate limit, print an error message
     print("All keys have exceeded the rate limit.")
     return None
 
 
+def search_pages(website, max_pages, priority, results, seen, stop_event, **kwargs):
+    """Fetch pages in waves (page 0 alone) until 40 results; return True if all keys are rate limited."""
+    page = 0
+    while page < max_pages:
+        if stop_event.is_set():
+            return True
+        pages_needed = -(-(40 - len(results)) // 10)
+        wave_size = 1 if page == 0 else PAGE_WAVE_SIZE
+        wave = range(page, min(page + wave_size, page + pages_needed, max_pages))
+        with ThreadPoolExecutor(max_workers=len(wave)) as executor:
+            responses = list(executor.map(lambda p: google_search(p, website, **kwargs), wave))
+        # Process pages in order so results keep the search ranking
+        for current_results in responses:
+            if current_results == None:
+                stop_event.set()
+                return True
+            items = current_results.get('items', [])
+            for item in items:
+                item['priority'] = priority
+
+            new_items = [item for item in items if item.get('link') and item['link'] not in seen]
+            seen.update(item['link'] for item in new_items)
+            results.extend(new_items)
+            if (len(results) >= 40 or len(items) < 10
+                    or 'nextPage' not in current_results.get('queries', {})):
+                return False
+        page = wave.stop
+    return False
+
+
+def _build_query(and_terms, exact, any_terms, none_terms):
+    """Describe one search's terms for tracking, e.g. 'AND: foo | EXACT: "bar"'."""
+    query_parts = []
+    if and_terms:
+        query_parts.append(f"AND: {and_terms}")
+    if exact:
+        query_parts.append(f'EXACT: "{exact}"')
+    if any_terms:
+        query_parts.append(f"OR: {any_terms}")
+    if none_terms:
+        query_parts.append(f"NOT: {none_terms}")
+    return " | ".join(query_parts)
+
+
+def search_website(website, searches, stop_event):
+    """Run Search 1-3 for one website off the script thread; return (results, query, limit_exceeded, error)."""
+    results = []
+    # Links already collected for this website, shared by all three searches
+    seen = set()
+    # Query strings of the searches that ran, joined once at the end
+    query_strings = []
+    limit_exceeded = False
+    error = None
+
+    for priority, max_pages, terms, search_query in searches:
+        if priority > 1 and not any(terms):
+            continue
+        if limit_exceeded or len(results) >= 40:
+            break
+        query_strings.append(search_query or f"search on {website}")
+        and_terms, exact, any_terms, none_terms = terms
+        try:
+            limit_exceeded = search_pages(
+                website, max_pages, priority, results, seen, stop_event,
+                q=and_terms, exactTerms=exact, orTerms=any_terms, excludeTerms=none_terms)
+        except requests.RequestException as e:
+            print(f"Error searching {website}: {e}")
+            error = str(e)
+            break
+    return results[:40], "; ".join(query_strings), limit_exceeded, error
+
+
+def results_to_csv(items):
+    """Serialize a list of result dicts to CSV, with one column per key found in any item."""
+    if not items:
+        return ""
+    fieldnames = list(dict.fromkeys(key for item in items for key in item))
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=fieldnames, lineterminator="\n")
+    writer.writeheader()
+    writer.writerows(items)
+    return buffer.getvalue()
+
+
+@st.cache_data(show_spinner=False, max_entries=100, ttl=3600)
+def _csv_for(fingerprint, _items):
+    """
+    Cached results_to_csv, so reruns (e.g. saving to Airtable) reuse the CSV.
+
+    Streamlit does not hash the underscore-prefixed _items argument; the cache is keyed
+    by fingerprint, which must change whenever the items do. The cache is shared by
+    all sessions, so entries also expire after an hour to bound any stale fields
+    the fingerprint does not cover.
+    """
+    return results_to_csv(_items)
+
+
 st.set_page_config(layout="wide", page_title="Greylitsearcher",
                    page_icon="🔍️",)
 st.title('Greylitsearcher')
@@ -165,97 +319,40 @@ search_button = st.button('Search')
 limitExceeded = False
 
 if search_button:
-    st.session_state['results'] = {}
-    st.session_state['search_queries'] = {}  # Track search queries for Airtable
-    websites = websites.split('\n')
-    for website in websites:
-        if website:
-            st.session_state['results'][website] = []
-            # Build search query string for tracking
-            query_parts = []
-            if and1:
-                query_parts.append(f"AND: {and1}")
-            if exact1:
-                query_parts.append(f'EXACT: "{exact1}"')
-            if any1:
-                query_parts.append(f"OR: {any1}")
-            if none1:
-                query_parts.append(f"NOT: {none1}")
-            search_query_1 = " | ".join(query_parts) if query_parts else f"search on {website}"
-            
-            for page in range(4):
-                current_results = google_search(
-                    page, website, q=and1, exactTerms=exact1, orTerms=any1, excludeTerms=none1)
-                if current_results == None:
-                    limitExceeded = True
-                    break
-                for item in current_results.get('items', []):
-                    item['priority'] = 1
-
-                st.session_state['results'][website].extend(
-                    current_results.get('items', []))
-                if len(st.session_state['results'][website]) >= 40 or len(current_results.get('items', [])) < 10:
-                    break
-            
-            # Store search query for this website
-            st.session_state['search_queries'][website] = search_query_1
-            
-            if len(st.session_state['results'][website]) < 40 and (and2 or exact2 or any2 or none2):
-                # Build search query 2
-                query_parts_2 = []
-                if and2:
-                    query_parts_2.append(f"AND: {and2}")
-                if exact2:
-                    query_parts_2.append(f'EXACT: "{exact2}"')
-                if any2:
-                    query_parts_2.append(f"OR: {any2}")
-                if none2:
-                    query_parts_2.append(f"NOT: {none2}")
-                search_query_2 = " | ".join(query_parts_2) if query_parts_2 else f"search 2 on {website}"
-                st.session_state['search_queries'][website] = f"{search_query_1}; {search_query_2}"
-                for page in range(8):
-                    current_results = google_search(
-                        page, website, q=and2, exactTerms=exact2, orTerms=any2, excludeTerms=none2)
-                    if current_results == None:
-                        limitExceeded = True
-                        break
-                    for item in current_results.get('items', []):
-                        item['priority'] = 2
-
-                    st.session_state['results'][website].extend([item for item in current_results.get(
-                        'items', []) if item['link'] not in [i['link'] for i in st.session_state['results'][website]]])
-
-                    if len(st.session_state['results'][website]) >= 40 or len(current_results.get('items', [])) < 10:
-                        break
-            
-            if len(st.session_state['results'][website]) < 40 and (and3 or exact3 or any3 or none3):
-                # Build search query 3
-                query_parts_3 = []
-                if and3:
-                    query_parts_3.append(f"AND: {and3}")
-                if exact3:
-                    query_parts_3.append(f'EXACT: "{exact3}"')
-                if any3:
-                    query_parts_3.append(f"OR: {any3}")
-                if none3:
-                    query_parts_3.append(f"NOT: {none3}")
-                search_query_3 = " | ".join(query_parts_3) if query_parts_3 else f"search 3 on {website}"
-                current_query = st.session_state['search_queries'].get(website, search_query_1)
-                st.session_state['search_queries'][website] = f"{current_query}; {search_query_3}"
-                for page in range(10):
-                    current_results = google_search(
-                        page, website, q=and3, exactTerms=exact3, orTerms=any3, excludeTerms=none3)
-                    if current_results == None:
-                        limitExceeded = True
-                        break
-                    for item in current_results.get('items', []):
-                        item['priority'] = 3
-                    st.session_state['results'][website].extend([item for item in current_results.get(
-                        'items', []) if item['link'] not in [i['link'] for i in st.session_state['results'][website]]])
-
-                    if len(st.session_state['results'][website]) >= 40 or len(current_results.get('items', [])) < 10:
-                        break
-            st.session_state['results'][website] = st.session_state['results'][website][:40]
+    results_by_website = {}
+    search_queries = {}  # Track search queries for Airtable
+    websites = [website for website in websites.split('\n') if website]
+    # The searches are the same for every website, so their query strings are built once
+    searches = [
+        (priority, max_pages, terms, _build_query(*terms))
+        for priority, max_pages, terms in (
+            (1, 4, (and1, exact1, any1, none1)),
+            (2, 8, (and2, exact2, any2, none2)),
+            (3, 10, (and3, exact3, any3, none3)),
+        )
+    ]
+    # Set once all keys are rate limited, so no website sends further requests
+    stop_event = threading.Event()
+    failed_websites = []
+    # Websites are searched concurrently; each worker returns its results and the
+    # session state is written once, from the script thread, when all are done
+    with ThreadPoolExecutor(max_workers=SEARCH_WORKERS) as executor:
+        futures = {website: executor.submit(search_website, website, searches, stop_event)
+                   for website in websites}
+        for website, future in futures.items():
+            results, search_query, website_limit_exceeded, error = future.result()
+            results_by_website[website] = results
+            search_queries[website] = search_query
+            limitExceeded = limitExceeded or website_limit_exceeded
+            if error:
+                failed_websites.append(website)
+    st.session_state['results'] = results_by_website
+    st.session_state['search_queries'] = search_queries
+    if limitExceeded:
+        st.warning('Rate limit exceeded, so the search stopped early. Please try again later.')
+    if failed_websites:
+        st.warning(f"Network errors interrupted the search for: {', '.join(failed_websites)}. "
+                   "Their results may be incomplete; please try again.")
 
 
 
@@ -352,11 +449,15 @@ if 'results' in st.session_state.keys():
             st.write(f"### {website}")
             st.write(f"**{len(st.session_state['results'][website])}** results")
         with cols[1]:
-            df = pd.DataFrame(st.session_state['results'][website])
-            csv = df.to_csv(index=False)
+            items = st.session_state['results'][website]
+            fingerprint = tuple(
+                (item.get('link'), item.get('priority'), item.get('title'), item.get('snippet'))
+                for item in items
+            )
+            csv_data = _csv_for(fingerprint, items)
             btn = st.download_button(
                 label="Download CSV",
-                data=csv,
+                data=csv_data,
                 file_name=f"{website.replace('.', '_')}_results.csv",
                 mime="text/csv",
                 key=f"download_{website}"
@@ -367,6 +468,3 @@ if 'results' in st.session_state.keys():
             use_container_width=True,
             hide_index=True
         )
-        
-        if limitExceeded:
-            st.warning('Rate limit exceeded. Please try again later.')